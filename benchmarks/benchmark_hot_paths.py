@@ -0,0 +1,297 @@
+"""
+Offline microbenchmarks for the CPU heavy helpers of the pipeline:
+    - API.get_response: XML objectify + base64 decode of files, and xmltodict of file listings
+    - is_same_text_content: the normalized text comparison used by compare_contents
+    - SnowflakeConnection.prepare_df: the DataFrame preparation done before upload_df_to_snowflake
+
+The API is never called, requests.get is replaced by a canned response built from synthetic payloads.
+Each benchmark runs in its own subprocess, which records:
+    - seconds: the time of one call, from the best of --repeat loops sized with timeit's autorange
+    - peak_rss_increase_bytes: how far the resident set size of the subprocess rises above its value after the setup,
+      including native allocations such as the libxml2 tree built by objectify.fromstring. The interpreter,
+      the imports and the synthetic inputs are excluded. On Linux the peak is reset after the setup through
+      /proc/self/clear_refs; elsewhere ru_maxrss is used, which misses run peaks lower than the setup peak.
+    - peak_bytes: the tracemalloc peak of one more run, which only counts Python allocations
+
+Run from the repository root:
+    python -m benchmarks.benchmark_hot_paths --save-baseline
+    python -m benchmarks.benchmark_hot_paths --threshold 0.2
+The second command exits with status 1 when a benchmark is slower or uses more memory than the
+stored baseline by more than the threshold, when a measured benchmark has no baseline, or when no benchmark was run.
+"""
+import argparse
+import base64
+import gc
+import json
+import os
+import resource
+import string
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from unittest import mock
+from xml.sax.saxutils import escape
+
+import pandas as pd
+from pipeline_utils.api_callables import API
+from pipeline_utils.callables import is_same_text_content
+from pipeline_utils.SnowflakeConnection import SnowflakeConnection
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+KB = 1024
+MB = 1024 * KB
+PAYLOAD_SIZES = [1 * KB, 64 * KB, 1 * MB, 16 * MB, 128 * MB, 500 * MB]
+LISTING_SIZES = [10, 100, 1_000, 10_000, 100_000]
+
+
+class _FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.headers = {"Content-Type": "text/xml; charset=utf-8"}
+
+    def raise_for_status(self):
+        pass
+
+
+def _size_label(size: int) -> str:
+    if size >= MB:
+        return f"{size // MB}MB"
+    return f"{size // KB}KB"
+
+
+def _random_text(size: int) -> str:
+    # map random bytes onto the alphabet, so that only size bytes are held while generating large payloads
+    alphabet = (string.ascii_letters + string.digits + " \n.,-").encode("ascii")
+    table = bytes(alphabet[index % len(alphabet)] for index in range(256))
+    return os.urandom(size).translate(table).decode("ascii")
+
+
+def _file_names(count: int):
+    return [f"20230101-{index:08d}.pdf" for index in range(count)]
+
+
+def _base64_payload(size: int) -> bytes:
+    encoded = base64.b64encode(os.urandom(size)).decode("ascii")
+    return ('<?xml version="1.0" encoding="utf-8"?>\n' + f'<base64Binary xmlns="http://tempuri.org/">{encoded}</base64Binary>').encode("utf-8")
+
+
+def _listing_payload(count: int) -> bytes:
+    listing = "<fileList>" + "".join(f"<file>{file_name}</file>" for file_name in _file_names(count)) + "</fileList>"
+    return ('<?xml version="1.0" encoding="utf-8"?>\n' + f'<string xmlns="http://tempuri.org/">{escape(listing)}</string>').encode("utf-8")
+
+
+def _upload_rows_df(count: int) -> pd.DataFrame:
+    rows = [
+        {
+            "Date": "20230101-000000",
+            "File_Name": file_name,
+            "File_Exists_in_S3": "True",
+            "Contents_Modified": "False",
+            "Modified_File_Name": " ",
+        }
+        for file_name in _file_names(count)
+    ]
+    return pd.DataFrame(rows)
+
+
+def _get_response_case(payload: bytes):
+    api = API(username="benchmark", password="benchmark", host_url="http://localhost/")
+    # patched once for the whole subprocess, so that the patch itself is not timed
+    mock.patch("pipeline_utils.api_callables.requests.get", return_value=_FakeResponse(payload)).start()
+    return lambda: api.get_response("GetFileByName")
+
+
+def _compare_case(size: int):
+    s3_text = _random_text(size)
+    local_text = s3_text.rstrip()
+    return lambda: is_same_text_content(s3_text, local_text)
+
+
+def _prepare_df_case(count: int):
+    df = _upload_rows_df(count)
+    return lambda: SnowflakeConnection.prepare_df(df)
+
+
+def build_cases(max_size: int, max_files: int):
+    """
+    Returns a list of (name, setup) tuples, setup builds the inputs and returns the callable to be measured.
+    """
+    cases = []
+    for size in [size for size in PAYLOAD_SIZES if size <= max_size]:
+        cases.append((f"get_response_base64[{_size_label(size)}]", lambda size=size: _get_response_case(_base64_payload(size))))
+    for count in [count for count in LISTING_SIZES if count <= max_files]:
+        cases.append((f"get_response_listing[{count}]", lambda count=count: _get_response_case(_listing_payload(count))))
+    for size in [size for size in PAYLOAD_SIZES if size <= max_size]:
+        cases.append((f"is_same_text_content[{_size_label(size)}]", lambda size=size: _compare_case(size)))
+    for count in [count for count in LISTING_SIZES if count <= max_files]:
+        cases.append((f"prepare_df[{count}]", lambda count=count: _prepare_df_case(count)))
+    return cases
+
+
+def _proc_status_bytes(field: str) -> int:
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def _max_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _start_rss_tracking():
+    """
+    Returns a function giving the peak resident set size reached since this call, minus the current one.
+    """
+    if sys.platform.startswith("linux"):
+        start_rss = _proc_status_bytes("VmRSS")
+        try:
+            # writing 5 resets the peak (VmHWM) to the current resident set size
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            print("Could not reset the peak RSS through /proc/self/clear_refs, peak_rss_increase_bytes may include the setup", file=sys.stderr)
+        return lambda: max(0, _proc_status_bytes("VmHWM") - start_rss)
+
+    start_max_rss = _max_rss_bytes()
+    return lambda: _max_rss_bytes() - start_max_rss
+
+
+def measure(run, repeat: int) -> dict:
+    gc.collect()
+    peak_rss_increase = _start_rss_tracking()
+
+    # each repeat times a loop long enough (at least 0.2 s) for the small cases to measure the code rather than timer noise
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    gc.collect()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    peak_rss = peak_rss_increase()
+
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "peak_rss_increase_bytes": peak_rss, "peak_bytes": peak}
+
+
+def measure_in_subprocess(name: str, repeat: int) -> tuple:
+    """
+    Runs a single benchmark in a fresh interpreter, so that peak_rss_increase_bytes is not polluted by the previous benchmarks.
+    Returns the exit code of the subprocess and the measurements, which are None when it fails, e.g. when it is killed for running out of memory.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.benchmark_hot_paths", "--run-case", name, "--repeat", str(repeat)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.PIPE,
+    )
+    if completed.returncode != 0:
+        return completed.returncode, None
+    return completed.returncode, json.loads(completed.stdout.decode("utf-8").splitlines()[-1])
+
+
+def check_regressions(results: dict, baseline: dict, threshold: float):
+    """
+    Returns the list of regressions above threshold, and the list of measured benchmarks/metrics that have no baseline.
+    """
+    regressions = []
+    missing = []
+    for name, result in results.items():
+        for metric in ["seconds", "peak_rss_increase_bytes", "peak_bytes"]:
+            if metric not in baseline.get(name, {}):
+                missing.append(f"{name} {metric}")
+                continue
+            limit = baseline[name][metric] * (1 + threshold)
+            if result[metric] > limit:
+                regressions.append(f"{name} {metric}: {result[metric]:.6g} > {limit:.6g} (baseline {baseline[name][metric]:.6g})")
+    return regressions, missing
+
+
+def _report_failures(failures: list) -> int:
+    if not failures:
+        return 0
+    print(f"{len(failures)} benchmark(s) failed to run:")
+    for failure in failures:
+        print(failure)
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="path of the baseline json file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline instead of checking them")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression, 0.2 means 20%%")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed loops per benchmark")
+    parser.add_argument("--max-size", type=int, default=max(PAYLOAD_SIZES), help="largest payload size in bytes")
+    parser.add_argument("--max-files", type=int, default=max(LISTING_SIZES), help="largest number of files in a listing")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        # child process started by measure_in_subprocess
+        setup = dict(build_cases(max(PAYLOAD_SIZES), max(LISTING_SIZES)))[args.run_case]
+        print(json.dumps(measure(setup(), args.repeat)))
+        return 0
+
+    results = {}
+    failures = []
+    print(f"{'benchmark':<40} {'time':>14} {'rss increase':>15} {'peak python':>15}")
+    for name, _ in build_cases(args.max_size, args.max_files):
+        if args.filter not in name:
+            continue
+        returncode, result = measure_in_subprocess(name, args.repeat)
+        if result is None:
+            failures.append(f"{name} exited with code {returncode}")
+            print(f"{name:<40} failed with exit code {returncode}, a negative code means it was killed by that signal, e.g. -9 when out of memory")
+            continue
+        results[name] = result
+        print(f"{name:<40} {result['seconds']:>12.6f} s {result['peak_rss_increase_bytes'] / MB:>12.2f} MB {result['peak_bytes'] / MB:>12.2f} MB")
+
+    if not results and not failures:
+        print(f"No benchmark matches --filter {args.filter!r}, --max-size {args.max_size} and --max-files {args.max_files}")
+        return 1
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return _report_failures(failures)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}, run with --save-baseline first")
+        return 1
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions, missing = check_regressions(results, baseline, args.threshold)
+    print("--------------------------------------------------------------------------------")
+    if missing:
+        print(f"{len(missing)} measurement(s) have no baseline in {args.baseline}, run with --save-baseline to add them:")
+        for measurement in missing:
+            print(measurement)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for regression in regressions:
+            print(regression)
+    if missing or regressions:
+        _report_failures(failures)
+        return 1
+    print(f"No regression above {args.threshold:.0%} in {len(results)} benchmark(s)")
+    return _report_failures(failures)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
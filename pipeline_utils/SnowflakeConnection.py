@@ -90,14 +90,21 @@ class SnowflakeConnection(object):
         df.columns = df.columns.str.upper()
         return df
 
-    def upload_df_to_snowflake(self, df: pd.DataFrame, staging_table_name: str, raw_table_name: str, history_table_name: str):
-        self.conn.execute(f"USE ROLE {self.role_name}")
-
+    @staticmethod
+    def prepare_df(df: pd.DataFrame) -> pd.DataFrame:
         # ensure dataframe is in type string so that are all columns in snowflake are in type varchar
         df = df.astype(str)
 
-        # ensure all table names and column names are uppercase
+        # ensure all column names are uppercase
         df.columns = map(lambda x: str(x).upper(), df.columns)
+        return df
+
+    def upload_df_to_snowflake(self, df: pd.DataFrame, staging_table_name: str, raw_table_name: str, history_table_name: str):
+        self.conn.execute(f"USE ROLE {self.role_name}")
+
+        df = self.prepare_df(df)
+
+        # ensure all table names are uppercase
         staging_table_name = staging_table_name.upper()
         raw_table_name = raw_table_name.upper()
         history_table_name = history_table_name.upper()
@@ -18,6 +18,7 @@ class API:
         self.init_args(
             init_args=locals(),
             required_arg_keys=["username", "password", "host_url"],
+            env_var_key_prefix="api_",
         )
 
     def init_args(self, init_args: dict, required_arg_keys: list, env_var_key_prefix: list):
@@ -56,7 +57,7 @@ class API:
             # prepare xml
             xml_root = objectify.fromstring(
                 response.content,
-                parser=etree.XMLParser(encoding="utf-8"),
+                parser=etree.XMLParser(encoding="utf-8", huge_tree=True),
             )
             xml_tag = re.sub(r"[\{].*?[\}]", "", xml_root.tag)
             xml_text = xml_root.text
@@ -78,7 +79,7 @@ class API:
             if xml_tag == "base64Binary" and isinstance(xml_text, str):
                 response_content = b64decode(xml_text)
             elif xml_tag == "string" and isinstance(xml_text, str):
-                response_content = xmltodict.parse('<root>' + xml_text.replace("&", "&amp;")+ '</root')
+                response_content = xmltodict.parse('<root>' + xml_text.replace("&", "&amp;")+ '</root>')
             else:
                 response_content = xml_text
         else:
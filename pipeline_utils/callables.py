@@ -1,6 +1,8 @@
 from airflow.models import Variable
+from pipeline_utils.profiling import profile_task
 
 
+@profile_task
 def _download_from_api(api_endpoint):
     import traceback
 
@@ -48,6 +50,45 @@ def _download_from_api(api_endpoint):
     print("--------------------------------------------------------------------------------")
 
 
+def is_same_text_content(s3_text, local_text):
+    """
+    This method compares two texts by their alphabetic characters only, so that differences in whitespace, digits or punctuation are ignored.
+    Args:
+        s3_text (str): Decoded contents of the file stored in S3.
+        local_text (str): Contents of the file downloaded locally.
+    """
+    return [text for text in s3_text if text.isalpha()] == [text for text in local_text if text.isalpha()]
+
+
+def is_same_binary_content(obj, local_file_path):
+    """
+    This method compares an S3 object with a local file byte by byte. The sizes are compared first, then the S3 object is read
+    with ranged GETs and each chunk is compared against a memory map of the local file, stopping at the first chunk that differs.
+    Args:
+        obj (s3.Object): The S3 object, from boto3.resource("s3").Object(bucket, key).
+        local_file_path (str): The path of the file downloaded locally.
+    """
+    import mmap
+    import os
+
+    from pipeline_utils.constants import S3_COMPARE_CHUNK_SIZE
+
+    local_size = os.path.getsize(local_file_path)
+    if obj.content_length != local_size:
+        return False
+    if local_size == 0:
+        return True
+
+    with open(local_file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as local_data:
+        for chunk_start in range(0, local_size, S3_COMPARE_CHUNK_SIZE):
+            chunk_end = min(chunk_start + S3_COMPARE_CHUNK_SIZE, local_size) - 1
+            # IfMatch ties every chunk to the version the size was read from, a concurrent overwrite raises instead of mixing versions
+            s3_chunk = obj.get(Range=f"bytes={chunk_start}-{chunk_end}", IfMatch=obj.e_tag)["Body"].read()
+            if s3_chunk != local_data[chunk_start : chunk_end + 1]:
+                return False
+    return True
+
+
 def compare_contents(
     filename,
     S3_BUCKET_NAME,
@@ -56,7 +97,7 @@ def compare_contents(
     S3_PATH,
     LOCAL_PATH,
 ):
-"""
+    """
     This method is used to compare the data of files coming from the endpoint and the files that are already present. The logic considers 2 cases:
     - For files with same file name, only the files, for which the data has been modified/updated will be uploaded, with a modification in the name. We will be adding the datastamp to the filename of the modified/updated file 
     - For files with different file name, it will be uploaded as is.
@@ -68,14 +109,10 @@ def compare_contents(
         S3_PATH: The path of the folder in which the file, downloaded from a specific api_endpoint should be saved.
         LOCAL_PATH: The path where the files should be downloaded locally
     """
-    import filecmp
     import os
 
     import boto3
-    from pipeline_utils.constants import (
-        CREDENTIALS,
-        LOCAL_PATH_DOWNLOAD_FROM_S3,
-    )
+    from pipeline_utils.constants import CREDENTIALS
 
     bucket = S3_BUCKET_NAME
     access_key_id = aws_access_key_id
@@ -87,40 +124,23 @@ def compare_contents(
         aws_secret_access_key=secret_access_key,
     )
     obj = s3_object.Object(bucket, os.path.join(S3_PATH, filename))
-    s3_file_data_encode = obj.get()["Body"].read()
 
     if ".pdf" in filename:
-        # downloading the files from s3 and then comparing the contents
-        get_pdf_file_from_s3 = boto3.client(
-            "s3",
-            region_name=CREDENTIALS.get("s3").get("region_name"),
-            aws_access_key_id=CREDENTIALS.get("s3").get("aws_access_key_id"),
-            aws_secret_access_key=CREDENTIALS.get("s3").get("aws_secret_access_key"),
-        )
-        get_pdf_file_from_s3.download_file(
-            Bucket=S3_BUCKET_NAME,
-            Key=os.path.join(S3_PATH, filename),
-            Filename=os.path.join(LOCAL_PATH_DOWNLOAD_FROM_S3, filename),
-        )
-
+        # comparing the sizes first and then the contents chunk by chunk, without downloading the file from s3
         # return TRUE if the contents are same
-        value = filecmp.cmp(
-            os.path.join(LOCAL_PATH, filename),
-            os.path.join(LOCAL_PATH_DOWNLOAD_FROM_S3, filename),
-        )
-        if os.path.exists(os.path.join(LOCAL_PATH_DOWNLOAD_FROM_S3, filename)):
-            os.remove(os.path.join(LOCAL_PATH_DOWNLOAD_FROM_S3, filename))
-        return value
+        return is_same_binary_content(obj, os.path.join(LOCAL_PATH, filename))
 
     else:
         # only reading and decoding the contents from S3
         #return TRUE if contents are same
+        s3_file_data_encode = obj.get()["Body"].read()
         read_content_from_s3 = s3_file_data_encode.decode("utf-8")
         with open(os.path.join(LOCAL_PATH, filename), "r") as file:
             read_data_from_local = file.read().rstrip()
-        return [text for text in read_content_from_s3 if text.isalpha()] == [text for text in read_data_from_local if text.isalpha()]
+        return is_same_text_content(read_content_from_s3, read_data_from_local)
 
 
+@profile_task
 def _upload_to_s3(api_endpoint):
     """
     This method uploads the downloaded file to S3. While uploading, it notes down if the file contents are modified or not and the same logic will be uploaded to snowflake for reference purposes.
@@ -270,6 +290,7 @@ def _upload_to_s3(api_endpoint):
     print("--------------------------------------------------------------------------------")
 
 
+@profile_task
 def _delete_locally(api_endpoint):
     """
     This method is used to delete files that were downloaded locally.
@@ -21,5 +21,7 @@ LOCAL_PATH_UNVIEWED_ERAM_FILES = os.path.join(LOCAL_PATH_ROOT, "unviewed_Eram_fi
 
 LOCAL_PATH_DOWNLOAD_FROM_S3 = os.path.join(LOCAL_PATH_ROOT, "unviewed_files_from_s3")
 
+S3_COMPARE_CHUNK_SIZE = 8 * 1024 * 1024
+
 
 TIMEZONE_CST = pytz.timezone(" ")
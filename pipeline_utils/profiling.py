@@ -0,0 +1,223 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import traceback
+import tracemalloc
+
+from airflow.models import Variable
+
+PROFILING_VARIABLE_KEY = "profiling_targets"
+PROFILING_TOP_STATS = 50
+PROFILING_SAMPLE_INTERVAL = 0.1
+PROFILING_PEAK_GROWTH = 1.25
+PROFILING_PEAK_MIN_STEP = 1024 * 1024
+
+# allocations made by the import machinery and by tracemalloc itself are not reported
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+)
+
+
+def _profiling_targets():
+    """
+    Reads the list of profiling targets from the Airflow Variable `profiling_targets`.
+    An entry can be a task name (e.g. "upload_to_s3"), an api_endpoint (e.g. "unviewed_files"),
+    a full task id (e.g. "unviewed_files.upload_to_s3") or "*" to profile every wrapped task.
+    An invalid value is treated as no targets, so that a typo in this setting cannot fail the pipeline.
+    """
+    try:
+        targets = Variable.get(key=PROFILING_VARIABLE_KEY, default_var=[], deserialize_json=True)
+    except Exception:
+        print(f"Ignoring the Airflow Variable {PROFILING_VARIABLE_KEY}, it could not be read as JSON, e.g. [\"unviewed_files\"]")
+        print(traceback.format_exc())
+        return set()
+
+    if targets is None:
+        return set()
+    if isinstance(targets, str):
+        targets = [targets]
+    if not isinstance(targets, list) or not all(isinstance(target, str) for target in targets):
+        print(f"Ignoring the Airflow Variable {PROFILING_VARIABLE_KEY}, expected a JSON list of strings but got {targets!r}")
+        return set()
+    return set(targets)
+
+
+def _task_log_dir(ti):
+    """
+    Returns the folder holding the log file of the running task instance, as configured by the
+    [logging] log_filename_template of the Airflow deployment.
+    """
+    import logging
+
+    from airflow.utils.log.file_task_handler import FileTaskHandler
+
+    for handler in logging.getLogger("airflow.task").handlers:
+        if isinstance(handler, FileTaskHandler):
+            # the file the task is logging to, opened by set_context when the task started
+            log_file = getattr(getattr(handler, "handler", None), "baseFilename", None)
+            if log_file is None:
+                log_file = os.path.join(handler.local_base, handler._render_filename(ti, ti.try_number))
+            return os.path.dirname(log_file)
+
+    raise Exception("No file task handler is configured for the airflow.task logger, the task log folder is unknown")
+
+
+def _artifact_prefix(ti):
+    """
+    Returns the prefix of the artifact file names, unique per task, mapped task index and attempt, since a custom
+    log_filename_template may put the logs of several of them in one folder.
+    """
+    prefix = f"profile_{ti.task_id}"
+    if getattr(ti, "map_index", -1) >= 0:
+        prefix += f"_map_index={ti.map_index}"
+    return f"{prefix}_attempt={ti.try_number}"
+
+
+def _write_artifacts(log_dir, prefix, profiler, memory, elapsed):
+    """
+    Writes the cProfile stats (binary pstats and a readable summary) and the tracemalloc top allocators to log_dir.
+    The allocators are reported near the peak and at the end of the task, both as differences from the start of the task.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+
+    pstats_path = os.path.join(log_dir, f"{prefix}.pstats")
+    profiler.dump_stats(pstats_path)
+
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILING_TOP_STATS)
+    with open(os.path.join(log_dir, f"{prefix}.cpu.txt"), "w") as f:
+        f.write(f"Wall time: {elapsed:.3f} s\n")
+        f.write(summary.getvalue())
+
+    with open(os.path.join(log_dir, f"{prefix}.memory.txt"), "w") as f:
+        current, peak = memory["traced"]
+        start_snapshot = memory["start"].filter_traces(SNAPSHOT_FILTERS)
+        f.write(f"Traced memory at the end: {current / 1024:.1f} KiB, peak: {peak / 1024:.1f} KiB\n")
+        f.write("tracemalloc only counts Python allocations, native ones (e.g. libxml2 trees) are not included.\n\n")
+
+        sampler = memory["sampler"]
+        if sampler.snapshot is None:
+            f.write(f"Allocations near the peak: no snapshot, traced memory never grew by {PROFILING_PEAK_GROWTH - 1:.0%} and {PROFILING_PEAK_MIN_STEP // 1024} KiB over the start of the task.\n\n")
+        else:
+            f.write(
+                f"Allocations near the peak, compared to the start of the task: snapshot at {sampler.snapshot_traced / 1024:.1f} KiB traced, "
+                + f"{sampler.snapshot_elapsed:.1f} s into the task (sampled every {PROFILING_SAMPLE_INTERVAL} s)\n"
+            )
+            for stat in sampler.snapshot.filter_traces(SNAPSHOT_FILTERS).compare_to(start_snapshot, "lineno")[:PROFILING_TOP_STATS]:
+                f.write(f"{stat}\n")
+            f.write("\n")
+
+        f.write("Allocations still alive at the end of the task, compared to the start of the task\n")
+        for stat in memory["end"].filter_traces(SNAPSHOT_FILTERS).compare_to(start_snapshot, "lineno")[:PROFILING_TOP_STATS]:
+            f.write(f"{stat}\n")
+
+    return pstats_path
+
+
+class _PeakSampler(threading.Thread):
+    """
+    Takes a tracemalloc snapshot every time the traced memory grows by PROFILING_PEAK_GROWTH and at least
+    PROFILING_PEAK_MIN_STEP bytes over the last one, polling every PROFILING_SAMPLE_INTERVAL seconds, so that the
+    allocators near the peak can be reported. The steps keep the number of snapshots, which pause the task, small.
+    """
+
+    def __init__(self, start_traced: int):
+        super().__init__(daemon=True)
+        self.stop_event = threading.Event()
+        self.start_time = time.perf_counter()
+        self.snapshot = None
+        self.snapshot_traced = start_traced
+        self.snapshot_elapsed = None
+
+    def run(self):
+        try:
+            while not self.stop_event.wait(PROFILING_SAMPLE_INTERVAL):
+                current, _ = tracemalloc.get_traced_memory()
+                if current > max(self.snapshot_traced * PROFILING_PEAK_GROWTH, self.snapshot_traced + PROFILING_PEAK_MIN_STEP):
+                    self.snapshot = tracemalloc.take_snapshot()
+                    self.snapshot_traced = current
+                    self.snapshot_elapsed = time.perf_counter() - self.start_time
+        except Exception:
+            print("Memory sampling stopped")
+            print(traceback.format_exc())
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+def profile_task(func):
+    """
+    Decorator for the pipeline callables. When the running task or its api_endpoint is listed in the
+    `profiling_targets` Airflow Variable, the call is run under cProfile and tracemalloc and the artifacts
+    are written next to the task logs. Otherwise the callable is run as is.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from airflow.operators.python import get_current_context
+
+        try:
+            ti = get_current_context()["ti"]
+        except Exception:
+            # not running inside an Airflow task, e.g. when called from a shell
+            return func(*args, **kwargs)
+
+        targets = _profiling_targets()
+        candidates = {ti.task_id, ti.task_id.split(".")[-1], kwargs.get("api_endpoint"), "*"}
+        if not targets & candidates:
+            return func(*args, **kwargs)
+
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        try:
+            start_snapshot = tracemalloc.take_snapshot()
+            sampler = _PeakSampler(start_traced=tracemalloc.get_traced_memory()[0])
+            sampler.start()
+        except Exception:
+            print(f"Could not start profiling {ti.task_id}, running it without profiling")
+            print(traceback.format_exc())
+            if not already_tracing:
+                tracemalloc.stop()
+            return func(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        start_time = time.perf_counter()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start_time
+            sampler.stop()
+            # profiling must never change the outcome of the task, so failures here are only printed
+            try:
+                memory = {
+                    "start": start_snapshot,
+                    "sampler": sampler,
+                    "end": tracemalloc.take_snapshot(),
+                    "traced": tracemalloc.get_traced_memory(),
+                }
+                log_dir = _task_log_dir(ti)
+                prefix = _artifact_prefix(ti)
+                pstats_path = _write_artifacts(log_dir, prefix, profiler, memory, elapsed)
+                print("--------------------------------------------------------------------------------")
+                print(f"Profiling artifacts for {ti.task_id} written to {os.path.dirname(pstats_path)}")
+                print("--------------------------------------------------------------------------------")
+            except Exception:
+                print(f"Could not write profiling artifacts for {ti.task_id}")
+                print(traceback.format_exc())
+                print()
+            finally:
+                if not already_tracing:
+                    tracemalloc.stop()
+
+    return wrapper